@@ -7,11 +7,48 @@ import tkinter as tk
 from tkinter import filedialog
 from tkinter import messagebox
 from tkinter import font
+from contextlib import contextmanager
+import json
 import os
 import time
 # import pyi_splash  # Uncomment when using executable Tool
 
 
+# Spans recorded by timed(). They can be written in the Chrome trace format (chrome://tracing) with save_timings()
+TIMINGS = []
+
+
+@contextmanager
+def timed(code, message):
+    """
+    Context manager that measures the wall and CPU time of the code inside it, writes it in the .log and saves the span.
+
+    Args:
+        code (str): Code of the message in the .log (e.g. "I1000").
+        message (str): Description of the measured task.
+    """
+    ti, ci = time.perf_counter(), time.process_time()
+    failed = False
+    try:
+        yield
+    except BaseException:
+        failed = True
+        raise
+    finally:
+        # If the code inside raised an error, the span is saved as failed and the message says it did not finish
+        tf, cf = time.perf_counter() - ti, time.process_time() - ci
+        TIMINGS.append({"name": message, "ph": "X", "pid": os.getpid(), "tid": 0,
+                        "ts": ti * 1e6, "dur": tf * 1e6, "args": {"cpu": cf, "failed": failed}})
+        status = f"FAILED after {tf} seconds" if failed else f"{tf} seconds"
+        n2p.N2PLog.Info.user(f"{code}: {message}: {status} (CPU: {cf} seconds)")
+
+
+def save_timings(path):
+    """Writes the spans recorded by timed() in a JSON file with the Chrome trace format"""
+    with open(path, "w") as f:
+        json.dump({"traceEvents": TIMINGS}, f, indent=1)
+
+
 class FolderFileSelectorApp:
     """Main class of App"""
 
@@ -154,18 +191,14 @@ class FolderFileSelectorApp:
 
                 # load_model() is the NaxToPy function that read mesh (.bdf files) or mesh and results (.op2 files).
                 # Is the same function for other solvers.
-                ti = time.time()
-                self.model = n2p.load_model(str(self.model_path), parallelprocessing=parallel)
-                tf = time.time() - ti
-                n2p.N2PLog.Info.user(f"I1000: Time to load the Mesh: {tf} seconds")
+                with timed("I1000", "Time to load the Mesh"):
+                    self.model = n2p.load_model(str(self.model_path), parallelprocessing=parallel)
 
                 if self.result_paths and self.model != self.result_paths:
 
                     # import_results_from_files() is the NaxToPy the results (.op2 files). Is the same function for other solvers.
-                    ti = time.time()
-                    self.model.import_results_from_files(self.result_paths)
-                    tf = time.time() - ti
-                    n2p.N2PLog.Info.user(f"I1001: Time to load the Results: {tf} seconds")
+                    with timed("I1001", "Time to load the Results"):
+                        self.model.import_results_from_files(self.result_paths)
 
                 self.print_model_data()
         except Exception:
@@ -199,11 +232,9 @@ class FolderFileSelectorApp:
                 return
             
             # new_envelope_loadcase() is a method of an N2PModelContent object that generate the load case as an envelope
-            ti = time.time()
-            n2p_env_vase = self.model.new_envelope_loadcase("ENV-CASE", formula)
+            with timed("I1002", "Time to generate the loadcase enevelopes"):
+                n2p_env_vase = self.model.new_envelope_loadcase("ENV-CASE", formula)
             self.env_case = f"<LC{n2p_env_vase.ID}:FR0>"
-            tf = time.time() - ti
-            n2p.N2PLog.Info.user(f"I1002: Time to generate the loadcase enevelopes: {tf} seconds")
             self.saved_env_formula.config(text=self.env_case)
 
             self.print_model_data()
@@ -220,11 +251,9 @@ class FolderFileSelectorApp:
             
             # new_envelope_loadcase() is a method of an N2PModelContent object that generate the load case as combination of
             # the original. The formula for the combination must be included.
-            ti = time.time()
-            n2p_dev_lc = self.model.new_derived_loadcase("DEV-CASE", formula)
+            with timed("I1002", "Time to generate derived load case"):
+                n2p_dev_lc = self.model.new_derived_loadcase("DEV-CASE", formula)
             self.dev_lc_case = f"<LC{n2p_dev_lc.ID}:FR0>"
-            tf = time.time() - ti
-            n2p.N2PLog.Info.user(f"I1002: Time to generate derived load case: {tf} seconds")
             self.saved_dev_lc_formula.config(text=self.dev_lc_case)
 
             self.print_model_data()
@@ -288,19 +317,24 @@ class FolderFileSelectorApp:
             # but the data is not generated until the method calculate() is called
             n2p_report = self.model.new_report(self.lcs_formula, False, "FORCES", "<FX:NONE#>,<FY:NONE#>,<FXY:NONE#>",
                                                False, self.model.get_elements(self.ids_list), "LC", coordsys=coordsys)
-            t1 = time.time()
             # Method of the N2PReport that calculate the data acording to the properties of the object.
-            n2p_report.calculate()
-            n2p.N2PLog.Info.user(f"I1003: Time to calculate the report: {time.time()-t1}")
-            
-            t1 = time.time()
+            with timed("I1003", "Time to calculate the report"):
+                n2p_report.calculate()
+
             # Method that writes the data. Must be called after using calculate()
-            n2p_report.to_csv("NaxToPy_report.csv")
-            n2p.N2PLog.Info.user(f"I1004: Time to print the report: {time.time()-t1}")
+            with timed("I1004", "Time to print the report"):
+                n2p_report.to_csv("NaxToPy_report.csv")
         except Exception:
             messagebox.showerror("Error Generating Report",
                                  "An error ocurred when generating the report. Please make sure the parameters are correct and try again.")
 
+        try:
+            # The times of all the steps are saved to be opened in chrome://tracing
+            save_timings("NaxToPy_timings.json")
+        except Exception:
+            messagebox.showwarning("Error Saving Times",
+                                   "The times of the steps could not be saved in NaxToPy_timings.json. They are still in the .log file.")
+
 
 def main():
     """Main function of the app"""
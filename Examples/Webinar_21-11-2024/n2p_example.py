@@ -40,7 +40,61 @@ def combine_loadcases(n2pmodel: n2p.AllClasses.N2PModelContent) -> tuple[n2p.All
     return env_ct, env_lc
 
 
-def writer(path: str, id_e: list[int], part_e: list[int], fx_cqudas: np.ndarray, fx_lc_cquads: np.ndarray) -> None:
+def element_arrays(n2pmodel: n2p.AllClasses.N2PModelContent) -> dict[str, np.ndarray]:
+    """Columnar view of the elements of the model. Each attribute is stored in a NumPy array, so the elements can be
+    selected with boolean masks instead of comprehension lists over the N2PElement objects.
+
+    Returns:
+        out: dict with the arrays "ID", "PartID", "InternalID", "TypeElement" and "Prop" (property id, -1 if the
+        element has no property), and the connectivity in CSR format: the nodes of the element i are
+        "Nodes"["NodesIndptr"[i]:"NodesIndptr"[i+1]], given as internal ids of the nodes (see node_arrays).
+    """
+
+    # The attributes are read in one single loop over the elements
+    elements = n2pmodel.get_elements()
+    ids = np.empty(len(elements), dtype=np.int64)
+    parts = np.empty(len(elements), dtype=np.int64)
+    internal_ids = np.empty(len(elements), dtype=np.int64)
+    props = np.empty(len(elements), dtype=np.int64)
+    indptr = np.zeros(len(elements) + 1, dtype=np.int64)
+    types = []
+    nodes = []
+    for i, element in enumerate(elements):
+        ids[i] = element.ID
+        parts[i] = int(element.PartID)
+        internal_ids[i] = element.InternalID
+        props[i] = -1 if element.Prop is None else element.Prop
+        types.append(element.TypeElement)
+        element_nodes = [node.InternalID for node in element.Nodes]
+        indptr[i + 1] = indptr[i] + len(element_nodes)
+        nodes += element_nodes
+
+    return {"ID": ids, "PartID": parts, "InternalID": internal_ids, "TypeElement": np.array(types), "Prop": props,
+            "NodesIndptr": indptr, "Nodes": np.array(nodes, dtype=np.int64)}
+
+
+def node_arrays(n2pmodel: n2p.AllClasses.N2PModelContent) -> dict[str, np.ndarray]:
+    """Columnar view of the nodes of the model.
+
+    Returns:
+        out: dict with the arrays "ID", "PartID", "InternalID" and "XYZ" (n_nodes, 3).
+    """
+
+    nodes = n2pmodel.get_nodes()
+    ids = np.empty(len(nodes), dtype=np.int64)
+    parts = np.empty(len(nodes), dtype=np.int64)
+    internal_ids = np.empty(len(nodes), dtype=np.int64)
+    xyz = np.empty((len(nodes), 3))
+    for i, node in enumerate(nodes):
+        ids[i] = node.ID
+        parts[i] = int(node.PartID)
+        internal_ids[i] = node.InternalID
+        xyz[i] = node.X, node.Y, node.Z
+
+    return {"ID": ids, "PartID": parts, "InternalID": internal_ids, "XYZ": xyz}
+
+
+def writer(path: str, id_e: np.ndarray, part_e: np.ndarray, fx_cqudas: np.ndarray, fx_lc_cquads: np.ndarray) -> None:
     """Writes the output in the NaxToView format"""
 
     with open(".\\fx_cquad_envelope.csv", "w", newline="") as f:
@@ -55,7 +109,10 @@ def main() -> None:
     path = r"C:\Webinar\model\SUBCASE_17500.dat"
     model = n2p.load_model(path)
 
-    cquads = [cuad for cuad in model.get_elements() if cuad.TypeElement == "CQUAD4"]
+    # Arrays with the attributes of the elements and nodes and the mask of the CQUAD4
+    elements = element_arrays(model)
+    nodes = node_arrays(model)
+    cquads = elements["TypeElement"] == "CQUAD4"
 
     model.import_results_from_files([
         r"C:\Webinar\model\subcase_17500.op2",
@@ -69,25 +126,37 @@ def main() -> None:
     # Call to the combine_loadcases function definded above. Modular structure helps to reuse and debug code.
     env_ct, env_lc = combine_loadcases(model)
 
-    # Get the results for FX
-    fx = env_ct.get_result("FORCES").get_component("FX").get_result_ndarray()[0][:len(model.get_elements())]
-
-    # Get the critical load cases
-    fx_lc = env_lc.get_result("FORCES").get_component("FX").get_result_ndarray()[0][:len(model.get_elements())]
-
     # Map of the ids that we need to search in the results
-    cquads_internal_ids = [cquad.InternalID for cquad in cquads]
+    cquads_internal_ids = elements["InternalID"][cquads]
 
     # In numpy you can access an array with a int:
     #     arr = [1, 4, 8, 12, 15] ; arr[2] -> 8
     # and with a list of ints:
     #     arr = [1, 4, 8, 12, 15] ; arr[[2,3]] -> [8, 12]
-    fx_cqudas = fx[cquads_internal_ids]
-    fx_lc_cquads = fx_lc[cquads_internal_ids]
+    # The internal ids are used directly, so there is no need to cut the array to the number of elements first.
+
+    # Get the results for FX
+    fx_cqudas = env_ct.get_result("FORCES").get_component("FX").get_result_ndarray()[0][cquads_internal_ids]
 
-    # Comprehension list to save the CQUAD4 ids and parts
-    id_e = [cquad.ID for cquad in cquads]
-    part_e = [cquad.PartID for cquad in cquads]
+    # Get the critical load cases
+    fx_lc_cquads = env_lc.get_result("FORCES").get_component("FX").get_result_ndarray()[0][cquads_internal_ids]
+
+    # The same mask selects the CQUAD4 ids and parts
+    id_e = elements["ID"][cquads]
+    part_e = elements["PartID"][cquads]
+
+    # Centroid of each CQUAD4: mean of the coordinates of its four nodes. The nodes of the elements are internal ids,
+    # so they are translated to their position in the node arrays
+    position = np.empty(nodes["InternalID"].max() + 1, dtype=np.int64)
+    position[nodes["InternalID"]] = np.arange(len(nodes["InternalID"]))
+    starts = elements["NodesIndptr"][:-1][cquads]
+    cquads_nodes = elements["Nodes"][starts[:, np.newaxis] + np.arange(4)]
+    centroids = nodes["XYZ"][position[cquads_nodes]].mean(axis=1)
+
+    # The critical CQUAD4 is written in the .log with its position
+    critical = np.abs(fx_cqudas).argmax()
+    n2p.N2PLog.Info.user(f"INFO-1000: Critical CQUAD4 {id_e[critical]}: FX = {fx_cqudas[critical]} in the load case "
+                         f"{fx_lc_cquads[critical]}, centroid at {centroids[critical].round(1).tolist()}")
 
     out_path = ".\\cquad_results.csv"
 
@@ -0,0 +1,141 @@
+"""Benchmark of the functions of results_fem.py with a NumpyModel made of copies of the GFEM of Examples/DEMO.
+
+For each step it saves the time and the throughput (values per second), and compares them with a baseline saved
+before. It does not need NaxTo. The first step reads the deck and builds the NumpyModel (read_bulk_cards): load_model
+and the other functions of NaxToPy that need NaxTo are not timed.
+
+    python benchmark.py --copies 10 --loadcases 200 --save        # Saves the results as the baseline
+    python benchmark.py --copies 10 --loadcases 200               # Compares with benchmark_baseline.json
+    python benchmark.py --memory                                  # Also the peak of memory allocated by each step
+
+The memory is measured with tracemalloc, which makes some steps (as the CSV report) much slower, so the times of a
+run with --memory must not be compared with the baseline.
+
+The times depend on the computer, so the baseline is not kept in git: save it in the same computer used for the
+comparison. The exit code is 1 if a step is slower than the baseline by more than the tolerance.
+"""
+
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+from functools import partial
+import tracemalloc
+
+import numpy as np
+
+import results_fem as rf
+from numpy_model import NumpyModel
+
+# The files of the INCLUDE 'SUBCASE_17500' and 'condensation' of this deck are not in the repository: they are skipped
+# with a warning, as only the mesh is used
+DECK = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "DEMO", "GFEM", "LAUNCHER_17500.dat")
+BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "benchmark_baseline.json")
+
+
+def _measure(function, values: int, memory: bool = False) -> tuple:
+    """Calls the function and returns its result and a dict with the time, the throughput and, if memory is True, the
+    peak of memory allocated"""
+    if memory:
+        tracemalloc.start()
+    ti = time.perf_counter()
+    out = function()
+    tf = time.perf_counter() - ti
+    stats = {"seconds": tf, "values_per_second": values / tf if tf > 0 else float("inf")}
+    if memory:
+        stats["peak_bytes"] = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+    return out, stats
+
+
+def run(copies: int = 1, loadcases: int = 20, chunk: int = 50, memory: bool = False, deck: str = DECK) -> dict:
+    """Runs every step of the benchmark and returns {step: {"seconds", "values_per_second"[, "peak_bytes"]}}"""
+    stats = {}
+    measure = partial(_measure, memory=memory)
+    model, stats["read_deck"] = measure(
+        lambda: NumpyModel.from_deck(deck, copies, missing_includes="warn", n_loadcases=loadcases), 0)
+    n_elements = len(model.element_ids)
+    stats["read_deck"]["values_per_second"] = n_elements / stats["read_deck"]["seconds"]
+    formula = ",".join(f"<LC{lc.ID}:FR1>" for lc in model.LoadCases)
+    values = loadcases * n_elements
+
+    _, stats["get_elements"] = measure(model.get_elements, n_elements)
+    index, stats["element_index"] = measure(lambda: rf.element_index(model), n_elements)
+    _, stats["to_internal_ids"] = measure(lambda: rf.to_internal_ids(index, model.element_ids[::10]),
+                                          n_elements // 10)
+    _, stats["results_by_loadcases"] = measure(lambda: rf.results_by_loadcases(model, "FORCES", "FX", formula),
+                                               values)
+    _, stats["envelope_by_chunks"] = measure(
+        lambda: rf.envelope_by_chunks(model, "FORCES", "FX", formula, "ExtremeMax", chunk=chunk), values)
+    coefficients = np.random.default_rng(0).normal(size=(loadcases, loadcases))
+    _, stats["combine_by_matrix"] = measure(
+        lambda: rf.combine_by_matrix(model, "FORCES", "FX", coefficients, formula), values)
+    _, stats["derived_component_by_loadcases"] = measure(
+        lambda: rf.derived_component_by_loadcases(model, "sqrt(<CMPT_FORCES:FX>^2+<CMPT_FORCES:FY>^2)", formula),
+        values)
+    with tempfile.TemporaryDirectory() as folder:
+        _, stats["report_by_chunks_csv"] = measure(
+            lambda: rf.report_by_chunks(model, "FORCES", ["FX", "FY", "FXY"], formula,
+                                        os.path.join(folder, "report.csv"), chunk=chunk), 3 * values)
+        _, stats["report_by_chunks_binary"] = measure(
+            lambda: rf.report_by_chunks(model, "FORCES", ["FX", "FY", "FXY"], formula,
+                                        os.path.join(folder, "report.bin"), chunk=chunk, binary=True), 3 * values)
+    return stats
+
+
+def compare(stats: dict, baseline: dict, tolerance: float) -> list:
+    """Returns the messages of the steps whose time is greater than the baseline time by more than the tolerance"""
+    slower = []
+    for step, values in stats.items():
+        if step in baseline and values["seconds"] > baseline[step]["seconds"] * (1 + tolerance):
+            slower.append(f"{step}: {values['seconds']:.4f} s (baseline {baseline[step]['seconds']:.4f} s)")
+    return slower
+
+
+def main(argv=None) -> int:
+    """Main function of the script"""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--copies", type=int, default=1, help="Copies of the GFEM in the model")
+    parser.add_argument("--loadcases", type=int, default=20, help="Number of load cases")
+    parser.add_argument("--chunk", type=int, default=50, help="Load cases per chunk")
+    parser.add_argument("--baseline", default=BASELINE, help="JSON file with the baseline")
+    parser.add_argument("--tolerance", type=float, default=0.5, help="Allowed slowdown (0.5 = 50 %%)")
+    parser.add_argument("--save", action="store_true", help="Save the results as the new baseline")
+    parser.add_argument("--memory", action="store_true", help="Measure the peak of memory (slower, not compared)")
+    args = parser.parse_args(argv)
+
+    stats = run(args.copies, args.loadcases, args.chunk, args.memory)
+    for step, values in stats.items():
+        memory = f"{values['peak_bytes'] / 2**20:10.1f} MiB" if args.memory else ""
+        print(f"{step:32} {values['seconds']:10.4f} s {values['values_per_second']:14.3e} values/s {memory}".rstrip())
+
+    if args.memory:
+        return 0
+
+    key = f"copies={args.copies},loadcases={args.loadcases},chunk={args.chunk}"
+    saved = {}
+    if os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            saved = json.load(f)
+
+    if args.save:
+        saved[key] = stats
+        with open(args.baseline, "w") as f:
+            json.dump(saved, f, indent=1)
+            f.write("\n")
+        return 0
+
+    if key not in saved:
+        print(f"There is no baseline for {key} in {args.baseline}. Use --save to create it.")
+        return 0
+
+    slower = compare(stats, saved[key], args.tolerance)
+    for message in slower:
+        print(f"SLOWER THAN BASELINE: {message}")
+    return 1 if slower else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,140 @@
+"""Model with the methods of N2PModelContent used by results_fem.py, with the mesh and the results in NumPy arrays.
+
+It does not need NaxTo, so the functions of results_fem.py can be tested and timed on any platform. The results are
+random numbers, always the same for the same load case, component, section and seed:
+
+    from numpy_model import NumpyModel
+    model = NumpyModel.from_deck(r"...\\Examples\\DEMO\\GFEM\\LAUNCHER_17500.dat", copies=10, n_loadcases=100)
+    fx, lcs, items = results_by_loadcases(model, "FORCES", "FX", "<LC1:FR1>,<LC2:FR1>")
+"""
+
+import numpy as np
+
+import results_fem
+
+
+class NumpyIncrement:
+    """Increment of a NumpyLoadCase"""
+    def __init__(self, ID):
+        self.ID = ID
+
+
+class NumpyLoadCase:
+    """Load case with the properties of N2PLoadCase used by results_fem.py"""
+    def __init__(self, ID, path_file=None):
+        self.ID = ID
+        self.Name = f"LC{ID}"
+        self.TypeLC = "LOADCASE"
+        self.PathFile = path_file
+        self.ActiveN2PIncrement = NumpyIncrement(1)
+
+    def get_increment(self, ID):
+        return NumpyIncrement(ID)
+
+
+class NumpyNode:
+    """Node with the properties of N2PNode used by results_fem.py"""
+    def __init__(self, ID, InternalID, X, Y, Z):
+        self.ID, self.PartID, self.InternalID = ID, 0, InternalID
+        self.X, self.Y, self.Z = X, Y, Z
+
+
+class NumpyElement:
+    """Element with the properties of N2PElement used by results_fem.py"""
+    def __init__(self, ID, InternalID, Prop, Nodes):
+        self.ID, self.PartID, self.InternalID = ID, 0, InternalID
+        self.TypeElement = "CQUAD4"
+        self.Prop = Prop
+        self.Nodes = Nodes
+
+
+class NumpyModel:
+    """Model of CQUAD4 elements with n_loadcases load cases (ids 1, 2, ...) that have the components given.
+
+    Args:
+        xyz (np.ndarray): coordinates of the nodes (n_nodes, 3).
+        node_ids (np.ndarray): ids of the nodes.
+        element_ids (np.ndarray): ids of the elements.
+        connectivity (np.ndarray): positions of the four nodes of each element (n_elements, 4).
+        props (np.ndarray): property id of each element. If it is None, all the elements have the property 1.
+        n_loadcases (int): number of load cases.
+        components (tuple): names of the components of every result.
+        seed (int): seed of the random results.
+        path_file (str): PathFile of the load cases.
+    """
+    def __init__(self, xyz, node_ids, element_ids, connectivity, props=None, n_loadcases=10,
+                 components=("FX", "FY", "FXY"), seed=0, path_file=None):
+        self.xyz = np.asarray(xyz, dtype=float)
+        self.node_ids = np.asarray(node_ids, dtype=np.int64)
+        self.element_ids = np.asarray(element_ids, dtype=np.int64)
+        self.connectivity = np.asarray(connectivity, dtype=np.int64)
+        self.props = np.ones(len(self.element_ids), dtype=np.int64) if props is None else np.asarray(props)
+        self.components = list(components)
+        self.seed = seed
+        self.LoadCases = [NumpyLoadCase(i, path_file) for i in range(1, n_loadcases + 1)]
+        self.FilePath = ""
+        self._nodes = self._elements = None
+
+    @classmethod
+    def grid(cls, nx: int, ny: int, **kwargs) -> "NumpyModel":
+        """Model of nx x ny CQUAD4 of size 1 in the plane XY"""
+        i, j = np.meshgrid(np.arange(nx + 1), np.arange(ny + 1))
+        xyz = np.column_stack((i.ravel(), j.ravel(), np.zeros(i.size)))
+        first = (np.arange(ny)[:, np.newaxis] * (nx + 1) + np.arange(nx)).ravel()
+        connectivity = np.column_stack((first, first + 1, first + nx + 2, first + nx + 1))
+        return cls(xyz, np.arange(1, len(xyz) + 1), np.arange(1, len(first) + 1), connectivity, **kwargs)
+
+    @classmethod
+    def from_deck(cls, path: str, copies: int = 1, offset: tuple = (0., 0., 1000.), missing_includes: str = "raise",
+                  **kwargs) -> "NumpyModel":
+        """Model with the GRID and CQUAD4 of a Nastran input file (read with results_fem.read_bulk_cards) repeated
+        copies times. Each copy is moved offset from the previous one and its ids are increased."""
+        cards = results_fem.read_bulk_cards(path, ("GRID", "CQUAD4"), missing_includes=missing_includes)
+        grids, quads = cards["GRID"], cards["CQUAD4"]
+        node_ids = grids[:, 0].astype(np.int64)
+        order = np.argsort(node_ids)
+        connectivity = order[np.searchsorted(node_ids[order], quads[:, 2:6].astype(np.int64))]
+        xyz = np.nan_to_num(grids[:, 2:5])
+        element_ids = quads[:, 0].astype(np.int64)
+
+        # The ids of each copy start after the greatest id of the previous one
+        step = max(node_ids.max(), element_ids.max()) + 1
+        k = np.arange(copies)
+        model = cls((xyz + k[:, np.newaxis, np.newaxis] * np.asarray(offset)).reshape(-1, 3),
+                    (node_ids + k[:, np.newaxis] * step).ravel(),
+                    (element_ids + k[:, np.newaxis] * step).ravel(),
+                    (connectivity + k[:, np.newaxis, np.newaxis] * len(node_ids)).reshape(-1, 4),
+                    props=np.tile(quads[:, 1].astype(np.int64), copies), **kwargs)
+        model.FilePath = path
+        return model
+
+    def result_array(self, lc: int, component: str, section: str = None) -> np.ndarray:
+        """Results of a component of a load case for all the elements, in one section if it is given"""
+        key = [self.seed, lc, self.components.index(component)] + ([] if section is None else list(section.encode()))
+        return np.random.default_rng(key).normal(size=len(self.element_ids))
+
+    def get_load_case(self, ID):
+        return next(lc for lc in self.LoadCases if lc.ID == ID)
+
+    def get_result_by_LCs_Incr(self, lc_incr, result, component, sections=None, aveSections=-1, **kwargs):
+        # As in NaxTo, several sections give one value per element: the maximum, minimum or average of the sections
+        if not sections:
+            return {(lc.ID, incr.ID): self.result_array(lc.ID, component) for lc, incr in lc_incr}
+        reduce = {-1: np.max, -2: np.min, -3: np.mean}[aveSections]
+        return {(lc.ID, incr.ID): reduce([self.result_array(lc.ID, component, s) for s in sections], axis=0)
+                for lc, incr in lc_incr}
+
+    def get_nodes(self):
+        if self._nodes is None:
+            self._nodes = [NumpyNode(int(i), n, *p) for n, (i, p) in enumerate(zip(self.node_ids, self.xyz.tolist()))]
+        return self._nodes
+
+    def get_elements(self):
+        if self._elements is None:
+            nodes = self.get_nodes()
+            self._elements = [NumpyElement(int(i), n, int(p), [nodes[c] for c in con]) for n, (i, p, con) in
+                              enumerate(zip(self.element_ids, self.props, self.connectivity.tolist()))]
+        return self._elements
+
+    def get_connectors(self):
+        return []
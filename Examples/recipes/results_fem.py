@@ -0,0 +1,632 @@
+"""Functions to work with NaxToPy and NumPy when there are lots of load cases or a big mesh.
+
+The functions only use the public methods of NaxToPy (get_load_case, get_result_by_LCs_Incr, get_elements,
+get_nodes and get_connectors), so they can be copied to any script or imported from this file:
+
+    import sys
+    sys.path.append(r"...\\Examples\\recipes")
+    from results_fem import results_by_loadcases
+
+The PartID of nodes and elements is always stored as int64, as in n2p_example.py.
+
+This script uses two external packages:
+    - numpy: https://pypi.org/project/numpy/
+    - scipy: https://pypi.org/project/scipy/ (only for mesh_graph and the functions that use the graph)
+"""
+
+import ast
+import glob
+import hashlib
+import itertools
+import json
+import mmap
+import os
+import re
+import tempfile
+import warnings
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+
+def _selectors(formula: str) -> list:
+    """Returns the "<LC#:FR#>" selectors of the formula. An error is raised if there is none."""
+    selectors = re.findall(r"<LC-?\d+:FR\d+>", formula)
+    if not selectors:
+        raise ValueError(f"No load cases found in the formula '{formula}'. Use the format <LC1:FR1>,<LC2:FR1>,...")
+    return selectors
+
+
+# ------------------------------------------------- RESULTS EXTRACTION -------------------------------------------------
+def results_by_loadcases(model: "N2PModelContent", result: str, component: str, formula: str, sections=None,
+                         aveSections=-1, cornerData=False, aveNodes=-1, variation=100, realPolar=0,
+                         coordsys: int = -1000, v1: tuple = (1,0,0), v2: tuple = (0,1,0),
+                         internal_ids: np.ndarray = None) -> tuple:
+    """Function that returns the results of a component for all the load cases of the formula "<LC1:FR1>,<LC2:FR1>,...".
+    It uses get_result_by_LCs_Incr, so all the load cases are asked to NaxTo in the same call. If internal_ids is given,
+    only those items are kept (see to_internal_ids).
+
+    Returns:
+        out:
+            - data: array (n_loadcases, n_items[, n_sections]) with one row per load case.
+            - index: array (n_loadcases, 2) with the load case and increment ids of each row.
+            - items: array (n_items,) with the internal id of each column. Use element_index() to translate it to
+              (PartID, ID).
+    """
+    # The load cases and increments are obtained once from the formula
+    lc_incr = [(model.get_load_case(int(lc)), int(fr)) for lc, fr in
+               (re.match(r"<LC(-?\d+):FR(\d+)>", s).groups() for s in _selectors(formula))]
+    lc_incr = [(lc, lc.get_increment(fr)) for lc, fr in lc_incr]
+
+    results = model.get_result_by_LCs_Incr(lc_incr, result, component, sections=sections, aveSections=aveSections,
+                                           cornerData=cornerData, aveNodes=aveNodes, variation=variation,
+                                           realPolar=realPolar, coordsys=coordsys, v1=v1, v2=v2)
+
+    keys = [(lc.ID, incr.ID) for lc, incr in lc_incr]
+
+    # The output array is allocated once and filled row by row, without intermediate lists
+    first = np.asarray(results[keys[0]])
+    items = np.arange(len(first)) if internal_ids is None else np.asarray(internal_ids)
+    if internal_ids is not None:
+        first = first[items]
+    data = np.empty((len(keys),) + first.shape, dtype=first.dtype)
+    for i, key in enumerate(keys):
+        data[i] = results[key] if internal_ids is None else np.asarray(results[key])[items]
+
+    return data, np.array(keys, dtype=np.int64), items
+
+
+def element_index(model: "N2PModelContent") -> tuple:
+    """Function that returns the (PartID, ID) of all the elements sorted and their internal ids in the same order"""
+    elements = model.get_elements()
+    keys = np.empty(len(elements), dtype=[("PartID", "i8"), ("ID", "i8")])
+    internal_ids = np.empty(len(elements), dtype=np.int64)
+    for i, element in enumerate(elements):
+        keys[i] = (int(element.PartID), element.ID)
+        internal_ids[i] = element.InternalID
+    order = np.argsort(keys, order=("PartID", "ID"))
+    return keys[order], internal_ids[order]
+
+
+def to_internal_ids(index: tuple, ids: np.ndarray, part_ids=0) -> np.ndarray:
+    """Function that returns the internal ids of the elements with the ids and part_ids given, using the index from
+    element_index(). part_ids can be one part for all the ids or an array with the part of each id.
+    """
+    keys, internal_ids = index
+    wanted = np.empty(len(ids), dtype=keys.dtype)
+    wanted["PartID"] = part_ids
+    wanted["ID"] = ids
+    position = np.searchsorted(keys, wanted).clip(max=len(keys) - 1)
+    if (keys[position] != wanted).any():
+        raise KeyError(f"Elements not found: {wanted[keys[position] != wanted][:10].tolist()}")
+    return internal_ids[position]
+
+
+# -------------------------------------------- ENVELOPES AND COMBINATIONS ----------------------------------------------
+# Value that is maximized by each criteria of the envelope (the same names as in new_envelope_loadcase)
+_ENVELOPE_CRITERIA = {"Max": lambda a: a, "Min": lambda a: -a,
+                      "ExtremeMax": lambda a: np.abs(a), "ExtremeMin": lambda a: -np.abs(a)}
+
+
+def envelope_by_chunks(model: "N2PModelContent", result: str, component: str, formula: str, criteria: str = "Max",
+                       chunk: int = 100, top_k: int = 0, coefficients=None, **kwargs) -> tuple:
+    """Function that returns, for each item, the envelope value of the load cases of the formula
+    "<LC1:FR1>,<LC2:FR1>,...", the load case id and the increment id where it is found. criteria may be "Max", "Min",
+    "ExtremeMax" (greatest absolute value) or "ExtremeMin" (lowest absolute value). If top_k > 0, the k critical values
+    of each item are also returned (critical first).
+    The load cases are read in chunks, so only the running envelope is kept in memory instead of every load case.
+    If coefficients (n_combinations, n_loadcases) is given, the envelope is made of the linear combinations of the load
+    cases of the formula, as in combine_by_matrix, without creating derived load cases. The load cases are read once
+    and the combinations are computed in chunks of rows. In this case the load case id returned is the row of the
+    combination and the increment id is -1.
+    The rest of the arguments (sections, coordsys, etc.) are passed to results_by_loadcases.
+    """
+    if criteria not in _ENVELOPE_CRITERIA:
+        raise ValueError(f"Unknown criteria '{criteria}'. Use one of: {', '.join(_ENVELOPE_CRITERIA)}")
+    score = _ENVELOPE_CRITERIA[criteria]
+    selectors = _selectors(formula)
+
+    def chunks():
+        if coefficients is None:
+            for i in range(0, len(selectors), chunk):
+                data, index, _ = results_by_loadcases(model, result, component, ",".join(selectors[i:i+chunk]),
+                                                      **kwargs)
+                yield data, index
+        else:
+            base, _, _ = results_by_loadcases(model, result, component, formula, **kwargs)
+            for i in range(0, coefficients.shape[0], chunk):
+                rows = np.arange(i, min(i + chunk, coefficients.shape[0]))
+                yield _combine(coefficients[i:i+chunk], base), np.column_stack((rows, np.full(len(rows), -1)))
+
+    env = env_ids = top = None
+    for data, index in chunks():
+        # Critical load case of the chunk, compared with the running envelope
+        arg = score(data).argmax(axis=0)
+        best = np.take_along_axis(data, arg[np.newaxis], axis=0)[0]
+        if env is None:
+            env, env_ids = best, index[arg]
+        else:
+            new = score(best) > score(env)
+            env = np.where(new, best, env)
+            env_ids = np.where(new[..., np.newaxis], index[arg], env_ids)
+
+        # Only the k critical values of each item are kept between chunks
+        if top_k > 0:
+            candidates = data if top is None else np.concatenate((top, data))
+            k = min(top_k, len(candidates))
+            top = np.take_along_axis(candidates, np.argpartition(-score(candidates), k - 1, axis=0)[:k], axis=0)
+
+    if top_k > 0:
+        top = np.take_along_axis(top, np.argsort(-score(top), axis=0), axis=0)
+        return env, env_ids[..., 0], env_ids[..., 1], top
+
+    return env, env_ids[..., 0], env_ids[..., 1]
+
+
+def combine_by_matrix(model: "N2PModelContent", result: str, component: str, coefficients, formula: str,
+                      **kwargs) -> np.ndarray:
+    """Function that returns the array (n_derived, n_items) of the derived load cases defined by the matrix coefficients
+    (n_derived, n_base) over the base load cases of the formula "<LC1:FR1>,<LC2:FR1>,...". The matrix may be a NumPy
+    array or a scipy.sparse matrix. Only the component asked is read and combined, with one matrix product.
+    The rest of the arguments (sections, coordsys, etc.) are passed to results_by_loadcases.
+    """
+    base, _, _ = results_by_loadcases(model, result, component, formula, **kwargs)
+    return _combine(coefficients, base)
+
+
+def _combine(coefficients, base: np.ndarray) -> np.ndarray:
+    """Returns the product of the matrix of coefficients (n_combinations, n_loadcases) and the results of the load
+    cases (n_loadcases, n_items[, n_sections])"""
+    if coefficients.shape[1] != base.shape[0]:
+        raise ValueError(f"The matrix has {coefficients.shape[1]} columns and there are {base.shape[0]} load cases")
+
+    # The items (and sections) are flattened, so one product combines all of them
+    return np.asarray(coefficients @ base.reshape(base.shape[0], -1)).reshape((-1,) + base.shape[1:])
+
+
+_FORMULA_FUNCTIONS = {"sqrt": np.sqrt, "abs": np.abs, "exp": np.exp, "log": np.log, "sin": np.sin, "cos": np.cos,
+                      "tan": np.tan, "maximum": np.maximum, "minimum": np.minimum,
+                      "max_sections": lambda a: np.max(a, axis=-1), "min_sections": lambda a: np.min(a, axis=-1),
+                      "absmax_sections": lambda a: np.take_along_axis(a, np.abs(a).argmax(axis=-1)[..., np.newaxis],
+                                                                      axis=-1)[..., 0]}
+
+
+# Nodes of the syntax tree allowed in a formula: numbers, variables, arithmetic and calls to _FORMULA_FUNCTIONS
+_FORMULA_NODES = (ast.Expression, ast.BinOp, ast.UnaryOp, ast.Call, ast.Name, ast.Constant, ast.Load, ast.Add,
+                  ast.Sub, ast.Mult, ast.Div, ast.Pow, ast.USub, ast.UAdd)
+
+
+def _compile_formula(expression: str, variables: list):
+    """Compiles the expression after checking that it only has numbers, the variables given, + - * / ** and calls to
+    the functions of _FORMULA_FUNCTIONS. Anything else (attributes, indexing, other names, etc.) raises a ValueError."""
+    tree = ast.parse(expression, mode="eval")
+    for node in ast.walk(tree):
+        allowed = isinstance(node, _FORMULA_NODES)
+        if isinstance(node, ast.Call):
+            allowed = isinstance(node.func, ast.Name) and node.func.id in _FORMULA_FUNCTIONS and not node.keywords
+        elif isinstance(node, ast.Name):
+            allowed = node.id in _FORMULA_FUNCTIONS or node.id in variables
+        elif isinstance(node, ast.Constant):
+            allowed = type(node.value) in (int, float)
+        if not allowed:
+            text = ast.unparse(node) if isinstance(node, ast.expr) else type(node).__name__
+            raise ValueError(f"'{text}' is not allowed in a formula. Use numbers, components, + - * / ^ and the "
+                             f"functions: {', '.join(_FORMULA_FUNCTIONS)}")
+    return compile(tree, "<formula>", "eval")
+
+
+def derived_component_by_loadcases(model: "N2PModelContent", formula: str, lc_formula: str, sections: list = None,
+                                   **kwargs) -> tuple:
+    """Function that returns the array (n_loadcases, n_items[, n_sections]) of a derived component for all the load
+    cases of lc_formula "<LC1:FR1>,<LC2:FR1>,..." and the array with the load case and increment ids of each row.
+    The formula uses the same syntax as new_derived_component(), for example
+    "sqrt(<CMPT_STRESSES:XX>^2+<CMPT_STRESSES:YY>^2-<CMPT_STRESSES:XX>*<CMPT_STRESSES:YY>+3*<CMPT_STRESSES:XY>^2)".
+    It is checked and compiled once, and each component of the formula is read once. Only numbers, components,
+    + - * / ^ and the functions sqrt, abs, exp, log, sin, cos, tan, maximum, minimum, max_sections, min_sections and
+    absmax_sections are allowed.
+    If sections is given (for example ["Z1", "Z2"]), each section is read on its own, so the components have a last
+    axis with one value per section, and the formula is evaluated section by section. The functions max_sections(),
+    min_sections() and absmax_sections() reduce that axis to one value per item. They need sections.
+    The rest of the arguments (coordsys, etc.) are passed to results_by_loadcases.
+    """
+    if sections is None and re.search(r"\b\w+_sections\(", formula):
+        raise ValueError("The functions max_sections(), min_sections() and absmax_sections() need the sections, "
+                         "for example sections=[\"Z1\", \"Z2\"]")
+
+    # Each different component is a variable of the compiled expression
+    components = list(dict.fromkeys(re.findall(r"<CMPT_([^:>]+):([^>]+)>", formula)))
+    expression = formula.replace("^", "**")
+    for i, (result, component) in enumerate(components):
+        expression = expression.replace(f"<CMPT_{result}:{component}>", f"_c{i}")
+    code = _compile_formula(expression, [f"_c{i}" for i in range(len(components))])
+
+    variables = dict(_FORMULA_FUNCTIONS)
+    index = None
+    for i, (result, component) in enumerate(components):
+        if sections is None:
+            variables[f"_c{i}"], index, _ = results_by_loadcases(model, result, component, lc_formula, **kwargs)
+        else:
+            # One call per section, as several sections in one call are reduced by NaxTo (aveSections)
+            per_section = [results_by_loadcases(model, result, component, lc_formula, sections=[s], **kwargs)
+                           for s in sections]
+            variables[f"_c{i}"] = np.stack([data for data, _, _ in per_section], axis=-1)
+            index = per_section[0][1]
+
+    return eval(code, {"__builtins__": {}}, variables), index
+
+
+# ------------------------------------------------------- CACHE --------------------------------------------------------
+def cached_results_by_loadcases(cache_dir: str, model: "N2PModelContent", result: str, component: str, formula: str,
+                                max_bytes: int = 10*2**30, **kwargs) -> tuple:
+    """Function that returns the same as results_by_loadcases, but the result array is a read-only np.memmap stored in
+    cache_dir as a .npy file, so a second session that asks for the same data does not read the results files again.
+    The key of the cache is made of the file of the model (path, size and modification time), of the id, increment,
+    name and file (path, size and modification time) of each load case in the order of the formula, and of all the
+    arguments. So a changed results file is never read from the cache, and the same ids given to load cases of other
+    files (NaxToPy renumbers the subcases with the same id when the files are imported in another order) or to the
+    elements of another mesh do not give the arrays of another session. Only load cases read from a results file can
+    be cached: derived and envelope load cases raise a ValueError, as their ids depend on the session.
+    When the folder is bigger than max_bytes, the least recently used arrays are removed.
+    """
+    sources = []
+    for selector in _selectors(formula):
+        lc_id, fr = re.match(r"<LC(-?\d+):FR(\d+)>", selector).groups()
+        lc = model.get_load_case(int(lc_id))
+        path_file = lc.PathFile
+        if not path_file or not os.path.isfile(path_file):
+            raise ValueError(f"The load case {lc_id} is not read from a results file and can not be cached. Derived "
+                             f"and envelope load cases must be asked with results_by_loadcases")
+        sources.append((lc.ID, int(fr), lc.Name, os.path.abspath(path_file), os.path.getsize(path_file),
+                        os.path.getmtime(path_file)))
+
+    # The internal ids (the columns of the arrays) depend on the mesh loaded
+    mesh = [model.FilePath]
+    if os.path.isfile(model.FilePath):
+        mesh = [os.path.abspath(model.FilePath), os.path.getsize(model.FilePath), os.path.getmtime(model.FilePath)]
+    key = hashlib.sha256(json.dumps([mesh, sources, result, component, sorted(kwargs.items())],
+                                    default=lambda o: o.tolist() if isinstance(o, np.ndarray) else str(o)
+                                    ).encode()).hexdigest()
+    data_path = os.path.join(cache_dir, key + ".npy")
+    index_path = os.path.join(cache_dir, key + ".index.npy")
+
+    if not (os.path.exists(data_path) and os.path.exists(index_path)):
+        data, index, _ = results_by_loadcases(model, result, component, formula, **kwargs)
+        os.makedirs(cache_dir, exist_ok=True)
+        _save(index_path, index)
+        _save(data_path, data)
+        _evict_cache(cache_dir, max_bytes)
+
+    # The access time is updated to keep the order of the least recently used arrays
+    os.utime(data_path)
+    data = np.load(data_path, mmap_mode="r")
+    items = np.arange(data.shape[1]) if kwargs.get("internal_ids") is None else np.asarray(kwargs["internal_ids"])
+    return data, np.load(index_path), items
+
+
+def _save(path: str, array: np.ndarray) -> None:
+    """Saves the array in a temporary file that is renamed at the end, so an interrupted write never leaves a .npy"""
+    fd, temporary = tempfile.mkstemp(suffix=".tmp", dir=os.path.dirname(path))
+    try:
+        with os.fdopen(fd, "wb") as f:
+            np.save(f, array)
+        os.replace(temporary, path)
+    except BaseException:
+        os.remove(temporary)
+        raise
+
+
+def _remove(path: str) -> bool:
+    """Removes the file. On Windows the files still opened as np.memmap can not be removed: they are kept."""
+    try:
+        os.remove(path)
+        return True
+    except PermissionError:
+        return False
+
+
+def _evict_cache(cache_dir: str, max_bytes: int) -> None:
+    """Function that removes the least recently used arrays of the cache until its size is lower than max_bytes.
+    The arrays that are still in use are skipped."""
+    entries = sorted(glob.glob(os.path.join(cache_dir, "*.index.npy")),
+                     key=lambda f: os.path.getmtime(f.replace(".index.npy", ".npy")))
+    size = sum(os.path.getsize(f) for f in glob.glob(os.path.join(cache_dir, "*.npy")))
+    for index_path in entries[:-1]:
+        if size <= max_bytes:
+            break
+        data_path = index_path.replace(".index.npy", ".npy")
+        entry_size = os.path.getsize(data_path) + os.path.getsize(index_path)
+        # The data is removed first: if it is in use, the entry is kept complete
+        if _remove(data_path):
+            _remove(index_path)
+            size -= entry_size
+
+
+def clear_cache(cache_dir: str) -> list:
+    """Function that removes all the arrays of the cache and the temporary files of interrupted writes. The arrays
+    returned by cached_results_by_loadcases that are still in use can not be removed on Windows: delete them (del data)
+    before calling this function. Returns the list of files that could not be removed.
+    """
+    kept = []
+    for data_path in glob.glob(os.path.join(cache_dir, "*.npy")):
+        # The index is kept with its data, so the entry stays complete
+        if data_path.endswith(".index.npy"):
+            continue
+        index_path = data_path.replace(".npy", ".index.npy")
+        if _remove(data_path):
+            if os.path.exists(index_path):
+                _remove(index_path)
+        else:
+            kept += [data_path, index_path]
+
+    # Index without data and temporary files of interrupted writes
+    for f in glob.glob(os.path.join(cache_dir, "*.index.npy")) + glob.glob(os.path.join(cache_dir, "*.tmp")):
+        if f not in kept and not _remove(f):
+            kept.append(f)
+    return kept
+
+
+# ------------------------------------------------------- REPORT -------------------------------------------------------
+def report_by_chunks(model: "N2PModelContent", result: str, components: list, formula: str, path: str,
+                     ids: np.ndarray = None, internal_ids: np.ndarray = None, chunk: int = 50,
+                     binary: bool = False, **kwargs) -> None:
+    """Function that writes the rows "LC, Increment, ID, component1, component2, ..." for every load case of the
+    formula "<LC1:FR1>,<LC2:FR1>,..." (one value per item) and every item of internal_ids (all the items if it is
+    None). ids are the ids written in the file (the internal ids if it is None).
+    The load cases are extracted in chunks and each block of rows is written while the next one is extracted, so the
+    memory used depends on the chunk and not on the size of the report.
+    If binary is True, the rows are written as typed records that can be read with np.fromfile(path, dtype) or
+    np.memmap, being dtype [("LC", "i8"), ("Increment", "i8"), ("ID", "i8"), (component, "f8"), ...]. Otherwise, a
+    CSV file with header is written, with 17 significant digits so it keeps the same values as the binary records.
+    The rest of the arguments (sections, coordsys, etc.) are passed to results_by_loadcases.
+    """
+    dtype = np.dtype([("LC", "i8"), ("Increment", "i8"), ("ID", "i8")] + [(c, "f8") for c in components])
+    # 17 significant digits: the values read from the CSV file are the same as the binary ones
+    row = ",".join(["%d"] * 3 + ["%.17g"] * len(components)) + "\n"
+    selectors = _selectors(formula)
+
+    def write(f, block):
+        if binary:
+            block.tofile(f)
+        else:
+            # One format operation for 100000 rows: np.savetxt formats the rows one by one and is 4 times slower
+            for j in range(0, len(block), 100000):
+                rows = block[j:j+100000]
+                f.write((row * len(rows)) % tuple(itertools.chain.from_iterable(rows.tolist())))
+
+    with (open(path, "wb") if binary else open(path, "w", newline="")) as f, ThreadPoolExecutor(max_workers=1) as pool:
+        if not binary:
+            f.write(",".join(dtype.names) + "\n")
+
+        pending = None
+        for i in range(0, len(selectors), chunk):
+            block = None
+            for name in components:
+                data, index, items = results_by_loadcases(model, result, name, ",".join(selectors[i:i+chunk]),
+                                                          internal_ids=internal_ids, **kwargs)
+                if block is None:
+                    block = np.empty((len(index), len(items)), dtype=dtype)
+                    block["LC"] = index[:, [0]]
+                    block["Increment"] = index[:, [1]]
+                    block["ID"] = ids if ids is not None else items
+                block[name] = data
+
+            # Only one block is waiting to be written at the same time
+            if pending is not None:
+                pending.result()
+            pending = pool.submit(write, f, block.ravel())
+
+        if pending is not None:
+            pending.result()
+
+
+# --------------------------------------------------- INPUT FILES ------------------------------------------------------
+def read_bulk_cards(path: str, cards: tuple = ("GRID",), max_workers: int = 8,
+                    missing_includes: str = "raise") -> dict:
+    """Function that reads the numeric fields of some card types of a Nastran input file, following the INCLUDE
+    statements. The files are read in parallel as memory maps and only the lines of the card types asked are copied.
+    The fields of each card type are converted to NumPy columns all at once.
+    It returns a dict with an array (n_cards, 8) for each card type asked with the fields 2-9 of the cards as float (the
+    ids are exact up to 2^53). Empty fields and fields with text are NaN. Small field (8 characters), large field
+    (16 characters, "GRID*" with its "*" continuation line) and free field (commas) cards are read. For small and free
+    field cards only the first line is read. The compact reals of Nastran (2.8-6) are supported.
+    An INCLUDE of a file that does not exist raises a FileNotFoundError, so a mistyped path does not give incomplete
+    arrays. With missing_includes="warn" a warning is given instead and the file is skipped.
+    """
+    if missing_includes not in ("raise", "warn"):
+        raise ValueError(f"Unknown missing_includes '{missing_includes}'. Use 'raise' or 'warn'")
+    names = [c.upper() for c in cards]
+    card_regex = re.compile(rb"^(" + b"|".join(re.escape(n.encode()) for n in names) +
+                            rb")(\*|[ ]*,|[ ])[^\r\n]*(?:\r?\n\*[^\r\n]*)?", re.M | re.I)
+    include_regex = re.compile(rb"^INCLUDE[ ]+(?:'([^']*)'|\"([^\"]*)\"|(\S+))", re.M | re.I)
+
+    def read_file(file):
+        found = {(n, form): [] for n in names for form in ("small", "large", "free")}
+        if os.path.getsize(file) == 0:
+            return found, []
+        with open(file, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as m:
+            # The regular expressions run over the memory map: only the lines found are copied
+            for match in card_regex.finditer(m):
+                separator = match.group(2)
+                form = "large" if separator == b"*" else ("free" if separator.endswith(b",") else "small")
+                found[(match.group(1).decode().upper(), form)].append(match.group(0))
+            includes = [next(g for g in match.groups() if g is not None).decode()
+                        for match in include_regex.finditer(m)]
+        return found, [os.path.join(os.path.dirname(file), include) for include in includes]
+
+    lines = {}
+    visited = {os.path.normcase(os.path.abspath(path))}
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        pending = [pool.submit(read_file, path)]
+        while pending:
+            found, includes = pending.pop().result()
+            for key, value in found.items():
+                lines.setdefault(key, []).extend(value)
+            # Each file is read once, so a cycle of INCLUDE statements does not loop forever
+            for include in includes:
+                normalized = os.path.normcase(os.path.abspath(include))
+                if normalized in visited:
+                    continue
+                visited.add(normalized)
+                if not os.path.isfile(include):
+                    message = f"The file '{include}' of an INCLUDE statement does not exist"
+                    if missing_includes == "raise":
+                        raise FileNotFoundError(message)
+                    warnings.warn(message)
+                    continue
+                pending.append(pool.submit(read_file, include))
+
+    out = {}
+    for card, name in zip(cards, names):
+        fields = [np.empty((0, 8), dtype="S16")]
+        small, large, free = lines[(name, "small")], lines[(name, "large")], lines[(name, "free")]
+        if small:
+            # The lines are cut in fields of 8 characters all at once
+            first = [l.split(b"\n")[0].rstrip(b"\r") for l in small]
+            fields.append(np.array([l.ljust(72)[8:72] for l in first], dtype="S64").view("S8").reshape(-1, 8))
+        if large:
+            # Two lines with four fields of 16 characters each
+            pairs = [(l.split(b"\n") + [b""])[:2] for l in large]
+            fields.append(np.hstack([np.array([p[i].rstrip(b"\r").ljust(72)[8:72] for p in pairs], dtype="S64")
+                                     .view("S16").reshape(-1, 4) for i in (0, 1)]))
+        if free:
+            rows = [(l.split(b"\n")[0].split(b"$")[0].rstrip(b"\r").split(b",")[1:9] + [b""] * 8)[:8] for l in free]
+            fields.append(np.array(rows, dtype="S16"))
+        out[card] = _to_float_columns(np.char.upper(np.char.strip(np.concatenate(fields).astype("S16"))))
+
+    return out
+
+
+def _to_float_columns(fields: np.ndarray) -> np.ndarray:
+    """Converts an array of fields of a Nastran card (bytes) to float, column by column. Empty fields and fields with
+    text are NaN."""
+    columns = np.full(fields.shape, np.nan)
+    for j in range(fields.shape[1]):
+        filled = fields[:, j] != b""
+        if not filled.any():
+            continue
+        text = re.sub(rb"(?<=[0-9.])([+-])", rb"E\1", b" ".join(fields[filled, j]).replace(b"D", b"E")).split()
+        try:
+            columns[filled, j] = np.array(text, dtype=float)
+        except ValueError:
+            # Columns with text (as the OFFT of the CBAR) are converted field by field
+            columns[filled, j] = [float(t) if re.fullmatch(rb"[-+]?[0-9.]+(E[-+]?[0-9]+)?", t) else np.nan
+                                  for t in text]
+    return columns
+
+
+# -------------------------------------------------------- MESH --------------------------------------------------------
+def _connector_nodes(connector) -> list:
+    """Returns the (PartID, ID) of the nodes of a connector: its free (independent), slave (dependent) and MPC/RSPLINE
+    nodes. N2PConnector gives them as (ID, PartID) tuples, not as N2PNode. A plain ID is taken from the part of the
+    connector."""
+    keys = []
+    for node in list(connector.FreeNodes) + list(connector.SlaveNodes) + list(connector.GridIDs):
+        keys.append((int(node[1]), int(node[0])) if isinstance(node, tuple) else (int(connector.PartID), int(node)))
+    return keys
+
+
+def mesh_graph(model: "N2PModelContent", connectors: bool = True) -> dict:
+    """Function that returns a dict with the graph of the mesh. Nodes and elements are numbered with their position in
+    the "NodeID"/"NodePartID" and "ElementID"/"ElementPartID" arrays. If connectors is True, the connectors of
+    get_connectors() are added after the elements, as rows with "IsConnector" True:
+        - "NodesIndptr" and "Nodes": nodes of each element in the order of its connectivity. The nodes of the element i
+          are Nodes[NodesIndptr[i]:NodesIndptr[i+1]].
+        - "Incidence": sparse matrix (n_elements, n_nodes) in CSR format. The row i has the nodes of the element i,
+          in any order (scipy may sort them): use "Nodes" when the order matters.
+        - "NodeElements": the same matrix transposed, in CSR format. The row j has the elements of the node j.
+        - "XYZ" and "Centroids": coordinates of the nodes and of the centroids of the elements.
+        - "NodeTree" and "CentroidTree": cKDTree for the nearest and within radius queries.
+    Keep the dict to reuse it: it is not built again by the other functions, and element_neighbors() saves its
+    matrices in it.
+    """
+    import scipy.sparse
+    from scipy.spatial import cKDTree
+
+    nodes = model.get_nodes()
+    elements = list(model.get_elements())
+    n_elements = len(elements)
+    node_ids = np.fromiter((n.ID for n in nodes), dtype=np.int64, count=len(nodes))
+    node_parts = np.fromiter((int(n.PartID) for n in nodes), dtype=np.int64, count=len(nodes))
+
+    # The internal id of a node is translated to its position in the arrays
+    node_internal = np.fromiter((n.InternalID for n in nodes), dtype=np.int64, count=len(nodes))
+    position = np.full(node_internal.max() + 1, -1, dtype=np.int64)
+    position[node_internal] = np.arange(len(nodes))
+
+    counts = np.fromiter((len(e.Nodes) for e in elements), dtype=np.int64, count=n_elements)
+    elem_nodes = position[np.fromiter((n.InternalID for e in elements for n in e.Nodes), dtype=np.int64,
+                                      count=counts.sum())]
+
+    if connectors:
+        # Some connectors are given as a list of connectors (same id in several parts)
+        connector_list = [co for con in model.get_connectors() for co in (con if isinstance(con, list) else [con])]
+        keys = [_connector_nodes(c) for c in connector_list]
+
+        # The nodes of the connectors are given by (PartID, ID): they are found in the (PartID, ID) of the nodes
+        node_keys = np.empty(len(nodes), dtype=[("PartID", "i8"), ("ID", "i8")])
+        node_keys["PartID"], node_keys["ID"] = node_parts, node_ids
+        order = np.argsort(node_keys, order=("PartID", "ID"))
+        wanted = np.array([k for c in keys for k in c], dtype=node_keys.dtype)
+        found = np.searchsorted(node_keys[order], wanted).clip(max=len(nodes) - 1)
+        if (node_keys[order][found] != wanted).any():
+            raise KeyError(f"Nodes of connectors not found: {wanted[node_keys[order][found] != wanted][:10].tolist()}")
+
+        elements += connector_list
+        counts = np.concatenate((counts, [len(c) for c in keys])).astype(np.int64)
+        elem_nodes = np.concatenate((elem_nodes, order[found]))
+
+    indptr = np.concatenate(([0], np.cumsum(counts)))
+    incidence = scipy.sparse.csr_matrix((np.ones(len(elem_nodes), dtype=np.int32), elem_nodes, indptr),
+                                        shape=(len(elements), len(nodes)))
+
+    xyz = np.array([(n.X, n.Y, n.Z) for n in nodes], dtype=float)
+    centroids = (incidence @ xyz) / np.maximum(counts, 1)[:, np.newaxis]
+
+    return {"NodeID": node_ids, "NodePartID": node_parts,
+            "ElementID": np.fromiter((e.ID for e in elements), dtype=np.int64, count=len(elements)),
+            "ElementPartID": np.fromiter((int(e.PartID) for e in elements), dtype=np.int64, count=len(elements)),
+            "IsConnector": np.arange(len(elements)) >= n_elements, "NodesIndptr": indptr, "Nodes": elem_nodes,
+            "Incidence": incidence, "NodeElements": incidence.T.tocsr(),
+            "XYZ": xyz, "Centroids": centroids, "NodeTree": cKDTree(xyz), "CentroidTree": cKDTree(centroids)}
+
+
+def element_neighbors(graph: dict, shared_nodes: int = 2) -> "scipy.sparse.csr_matrix":
+    """Function that returns the sparse matrix (n_elements, n_elements) of the elements that share at least
+    shared_nodes nodes. With 2, two shells are neighbors when they share an edge; with 1, when they share a node.
+    The matrix is computed once and saved in the graph.
+    """
+    neighbors = graph.setdefault("Neighbors", {})
+    if shared_nodes not in neighbors:
+        shared = (graph["Incidence"] @ graph["NodeElements"]).tocsr()
+        shared.setdiag(0)
+        shared.data = (shared.data >= shared_nodes).astype(np.int32)
+        shared.eliminate_zeros()
+        neighbors[shared_nodes] = shared
+    return neighbors[shared_nodes]
+
+
+def elements_with_nodes(graph: dict, nodes: np.ndarray, all_nodes: bool = False) -> np.ndarray:
+    """Function that returns the positions of the elements that have any (or all, if all_nodes is True) of the nodes
+    given (as positions in the arrays of the graph).
+    """
+    selected = np.zeros(graph["Incidence"].shape[1], dtype=np.int32)
+    selected[np.unique(nodes)] = 1
+    found = graph["Incidence"] @ selected
+    return np.flatnonzero(found == len(np.unique(nodes)) if all_nodes else found > 0)
+
+
+def free_edges(graph: dict, elements: np.ndarray) -> np.ndarray:
+    """Function that returns the array (n_edges, 2) with the nodes of the edges used by only one of the shell elements
+    given (as positions in the arrays of the graph).
+    """
+    indptr, nodes = graph["NodesIndptr"], graph["Nodes"]
+    elements = np.asarray(elements, dtype=np.int64)
+    starts = indptr[elements]
+    counts = indptr[elements + 1] - starts
+
+    # Position of each node in its element, so the edge goes to the next node (and the last one to the first)
+    local = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+    first = np.repeat(starts, counts)
+    edges = np.column_stack((nodes[first + local], nodes[first + (local + 1) % np.repeat(counts, counts)]))
+    unique, count = np.unique(np.sort(edges, axis=1), axis=0, return_counts=True)
+    return unique[count == 1]
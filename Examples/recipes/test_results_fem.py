@@ -0,0 +1,360 @@
+"""Tests of results_fem.py and benchmark.py. They use the NumpyModel of numpy_model.py instead of NaxTo, so they run
+with pytest on any platform."""
+
+import os
+
+import numpy as np
+import pytest
+
+import benchmark
+import results_fem as rf
+from numpy_model import NumpyLoadCase, NumpyModel
+
+
+@pytest.fixture
+def model():
+    """Grid of 5x4 CQUAD4 with the components FX and FY in the load cases 1-8"""
+    return NumpyModel.grid(5, 4, n_loadcases=8, components=("FX", "FY"))
+
+
+FORMULA = ",".join(f"<LC{lc}:FR1>" for lc in range(1, 9))
+
+
+def test_results_by_loadcases(model):
+    data, index, items = rf.results_by_loadcases(model, "FORCES", "FX", FORMULA)
+    assert data.shape == (8, 20)
+    assert index.tolist() == [[lc, 1] for lc in range(1, 9)]
+    assert items.tolist() == list(range(20))
+    assert np.array_equal(data[3], model.result_array(4, "FX"))
+
+
+def test_results_by_loadcases_internal_ids(model):
+    data, _, items = rf.results_by_loadcases(model, "FORCES", "FX", FORMULA, internal_ids=np.array([3, 7]))
+    assert items.tolist() == [3, 7]
+    assert np.array_equal(data[:, 1], [model.result_array(lc, "FX")[7] for lc in range(1, 9)])
+
+
+def test_results_by_loadcases_empty_formula(model):
+    with pytest.raises(ValueError):
+        rf.results_by_loadcases(model, "FORCES", "FX", "")
+
+
+def test_envelope_by_chunks(model):
+    stack = np.array([model.result_array(lc, "FX") for lc in range(1, 9)])
+    env, lc, incr, top = rf.envelope_by_chunks(model, "FORCES", "FX", FORMULA, "Max", chunk=3, top_k=2)
+    assert np.allclose(env, stack.max(axis=0))
+    assert np.array_equal(lc, stack.argmax(axis=0) + 1)
+    assert (incr == 1).all()
+    assert np.allclose(top, -np.sort(-stack, axis=0)[:2])
+
+
+def test_combine_by_matrix(model):
+    coefficients = np.zeros((2, 8))
+    coefficients[0, [0, 1]] = 1.5, 1.
+    coefficients[1, 7] = -1.
+    combined = rf.combine_by_matrix(model, "FORCES", "FX", coefficients, FORMULA)
+    assert np.allclose(combined[0], 1.5 * model.result_array(1, "FX") + model.result_array(2, "FX"))
+    assert np.allclose(combined[1], -model.result_array(8, "FX"))
+
+
+def test_derived_component_by_loadcases(model):
+    values, _ = rf.derived_component_by_loadcases(model, "sqrt(<CMPT_FORCES:FX>^2+<CMPT_FORCES:FY>^2)", FORMULA)
+    assert np.allclose(values[0], np.hypot(model.result_array(1, "FX"), model.result_array(1, "FY")))
+
+
+@pytest.mark.parametrize("function, reduce", [("max_sections", lambda a: a.max(axis=-1)),
+                                              ("min_sections", lambda a: a.min(axis=-1)),
+                                              ("absmax_sections", lambda a: np.take_along_axis(
+                                                  a, np.abs(a).argmax(axis=-1)[..., np.newaxis], axis=-1)[..., 0])])
+def test_derived_component_by_loadcases_sections(model, function, reduce):
+    fx = np.array([[model.result_array(lc, "FX", s) for s in ("Z1", "Z2")] for lc in range(1, 9)]).transpose(0, 2, 1)
+    values, _ = rf.derived_component_by_loadcases(model, "<CMPT_FORCES:FX>", FORMULA, sections=["Z1", "Z2"])
+    assert np.array_equal(values, fx)
+    values, _ = rf.derived_component_by_loadcases(model, f"{function}(2*<CMPT_FORCES:FX>)", FORMULA,
+                                                  sections=["Z1", "Z2"])
+    assert values.shape == (8, 20)
+    assert np.allclose(values, reduce(2 * fx))
+
+
+def test_derived_component_by_loadcases_errors(model):
+    # Without sections, there is no axis of sections to reduce
+    with pytest.raises(ValueError):
+        rf.derived_component_by_loadcases(model, "max_sections(<CMPT_FORCES:FX>)", FORMULA)
+    for formula in ("().__class__.__base__.__subclasses__()", "<CMPT_FORCES:FX>.sum()", "__import__('os')",
+                    "sqrt(<CMPT_FORCES:FX>)[0]", "'a'*2", "np.sqrt(<CMPT_FORCES:FX>)"):
+        with pytest.raises(ValueError):
+            rf.derived_component_by_loadcases(model, formula, FORMULA)
+
+
+def test_report_by_chunks(model, tmp_path):
+    path = tmp_path / "report.bin"
+    rf.report_by_chunks(model, "FORCES", ["FX", "FY"], FORMULA, str(path), internal_ids=np.array([2, 5]), chunk=3,
+                        binary=True)
+    dtype = np.dtype([("LC", "i8"), ("Increment", "i8"), ("ID", "i8"), ("FX", "f8"), ("FY", "f8")])
+    rows = np.fromfile(path, dtype)
+    assert len(rows) == 16
+    assert rows[-1]["LC"] == 8 and rows[-1]["ID"] == 5
+    assert rows[-1]["FY"] == model.result_array(8, "FY")[5]
+
+
+def test_report_by_chunks_csv(model, tmp_path):
+    path = tmp_path / "report.csv"
+    rf.report_by_chunks(model, "FORCES", ["FX", "FY"], FORMULA, str(path), ids=np.arange(100, 120), chunk=3)
+    rows = np.loadtxt(path, delimiter=",", skiprows=1)
+    assert path.read_text().startswith("LC,Increment,ID,FX,FY\n")
+    assert rows.shape == (160, 5)
+    assert rows[-1, :3].tolist() == [8, 1, 119]
+    assert rows[-1, 3:].tolist() == [model.result_array(8, "FX")[19], model.result_array(8, "FY")[19]]
+
+    # The CSV file has the same values as the binary one
+    rf.report_by_chunks(model, "FORCES", ["FX", "FY"], FORMULA, str(tmp_path / "report.bin"), chunk=3, binary=True)
+    binary = np.fromfile(tmp_path / "report.bin", np.dtype([("LC", "i8"), ("Increment", "i8"), ("ID", "i8"),
+                                                            ("FX", "f8"), ("FY", "f8")]))
+    assert np.array_equal(rows[:, 3:], np.column_stack((binary["FX"], binary["FY"])))
+
+
+@pytest.mark.parametrize("criteria, score", [("Max", lambda a: a), ("Min", lambda a: -a),
+                                             ("ExtremeMax", np.abs), ("ExtremeMin", lambda a: -np.abs(a))])
+def test_envelope_by_chunks_criteria(model, criteria, score):
+    stack = np.array([model.result_array(lc, "FX") for lc in range(1, 9)])
+    env, lc, _ = rf.envelope_by_chunks(model, "FORCES", "FX", FORMULA, criteria, chunk=3)
+    critical = score(stack).argmax(axis=0)
+    assert np.array_equal(lc, critical + 1)
+    assert np.allclose(env, stack[critical, np.arange(stack.shape[1])])
+
+
+def test_envelope_by_chunks_errors(model):
+    with pytest.raises(ValueError):
+        rf.envelope_by_chunks(model, "FORCES", "FX", FORMULA, "AbsMin")
+    with pytest.raises(ValueError):
+        rf.envelope_by_chunks(model, "FORCES", "FX", "")
+
+
+def test_envelope_by_chunks_combinations(model):
+    coefficients = np.random.default_rng(1).normal(size=(11, 8))
+    combined = coefficients @ np.array([model.result_array(lc, "FX") for lc in range(1, 9)])
+    env, row, incr = rf.envelope_by_chunks(model, "FORCES", "FX", FORMULA, "ExtremeMax", chunk=4,
+                                           coefficients=coefficients)
+    assert np.array_equal(row, np.abs(combined).argmax(axis=0))
+    assert np.allclose(env, combined[row, np.arange(combined.shape[1])])
+    assert (incr == -1).all()
+
+
+class _FileModel(NumpyModel):
+    """Model whose load cases are read from a file, with the derived load case -1 that has no file"""
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.LoadCases.append(NumpyLoadCase(-1))
+        self.calls = 0
+
+    def get_result_by_LCs_Incr(self, lc_incr, result, component, **kwargs):
+        self.calls += 1
+        return super().get_result_by_LCs_Incr(lc_incr, result, component, **kwargs)
+
+
+@pytest.fixture
+def file_model(tmp_path):
+    op2 = tmp_path / "results.op2"
+    op2.write_bytes(b"op2")
+    return _FileModel.grid(5, 4, n_loadcases=8, components=("FX", "FY"), path_file=str(op2))
+
+
+def test_cached_results_by_loadcases(file_model, tmp_path):
+    cache = str(tmp_path / "cache")
+    data, index, items = rf.cached_results_by_loadcases(cache, file_model, "FORCES", "FX", FORMULA)
+    again, _, _ = rf.cached_results_by_loadcases(cache, file_model, "FORCES", "FX", FORMULA)
+    assert file_model.calls == 1
+    assert isinstance(again, np.memmap)
+    assert np.array_equal(again, data)
+    del data, again
+    assert rf.clear_cache(cache) == []
+
+
+def test_cached_results_by_loadcases_key(file_model, tmp_path):
+    cache = str(tmp_path / "cache")
+    first, second = tmp_path / "first.op2", tmp_path / "second.op2"
+    first.write_bytes(b"op2")
+    second.write_bytes(b"op2")
+    for lc, path in zip(file_model.LoadCases, (first, second)):
+        lc.PathFile = str(path)
+    rf.cached_results_by_loadcases(cache, file_model, "FORCES", "FX", "<LC1:FR1>,<LC2:FR1>")
+
+    # The same ids in another session, where the files were imported in the other order
+    for lc, path in zip(file_model.LoadCases, (second, first)):
+        lc.PathFile = str(path)
+    rf.cached_results_by_loadcases(cache, file_model, "FORCES", "FX", "<LC1:FR1>,<LC2:FR1>")
+    assert file_model.calls == 2
+
+    # The same load cases with another mesh
+    file_model.FilePath = str(first)
+    rf.cached_results_by_loadcases(cache, file_model, "FORCES", "FX", "<LC1:FR1>,<LC2:FR1>")
+    assert file_model.calls == 3
+    rf.cached_results_by_loadcases(cache, file_model, "FORCES", "FX", "<LC1:FR1>,<LC2:FR1>")
+    assert file_model.calls == 3
+
+
+def test_cached_results_by_loadcases_derived(file_model, tmp_path):
+    # The load case -1 is derived: it has no file and its id depends on the session
+    with pytest.raises(ValueError):
+        rf.cached_results_by_loadcases(str(tmp_path), file_model, "FORCES", "FX", "<LC1:FR1>,<LC-1:FR0>")
+
+
+def test_cached_results_by_loadcases_interrupted(file_model, tmp_path, monkeypatch):
+    cache = str(tmp_path / "cache")
+
+    def interrupted(f, array):
+        f.write(b"\x93NUMPY")
+        raise KeyboardInterrupt
+
+    monkeypatch.setattr(rf.np, "save", interrupted)
+    with pytest.raises(KeyboardInterrupt):
+        rf.cached_results_by_loadcases(cache, file_model, "FORCES", "FX", FORMULA)
+    monkeypatch.undo()
+
+    # No truncated .npy is left, so the next call reads the results again
+    assert not list((tmp_path / "cache").iterdir())
+    data, _, _ = rf.cached_results_by_loadcases(cache, file_model, "FORCES", "FX", FORMULA)
+    assert data.shape == (8, 20)
+
+
+def test_evict_cache_in_use(file_model, tmp_path, monkeypatch):
+    cache = str(tmp_path / "cache")
+    for component in ("FX", "FY"):
+        rf.cached_results_by_loadcases(cache, file_model, "FORCES", component, FORMULA, max_bytes=10**6)
+
+    # As in Windows, the arrays opened as np.memmap can not be removed
+    def in_use(path):
+        raise PermissionError(path)
+
+    monkeypatch.setattr(rf.os, "remove", in_use)
+    rf._evict_cache(cache, 0)
+    assert len(rf.clear_cache(cache)) == 4
+
+
+def test_read_bulk_cards(tmp_path):
+    (tmp_path / "main.dat").write_bytes(b"BEGIN BULK\r\nINCLUDE 'mesh'\r\nINCLUDE empty\r\n"
+                                        b"GRID     1              0.      1.      2.8-6\r\n"
+                                        b"MAT1     1      70000.          .3\r\nENDDATA\r\n")
+    large = "".join(f"{f:<16}" for f in ("2", "", "-1.5", "2.0E+1"))
+    (tmp_path / "mesh").write_bytes(f"GRID*   {large}\r\n*       {'3.5':<16}\r\n".encode() +
+                                    b"grid,3,,4.,5.,6. $ free field\r\n"
+                                    b"CQUAD4   10      1       1       2       3       1\r\n"
+                                    b"INCLUDE 'main.dat'\r\n")
+    (tmp_path / "empty").write_bytes(b"")
+
+    cards = rf.read_bulk_cards(str(tmp_path / "main.dat"), ("GRID", "CQUAD4", "CBAR"))
+    grids = cards["GRID"][np.argsort(cards["GRID"][:, 0])]
+    assert np.allclose(grids[:, [0, 2, 3, 4]], [[1, 0, 1, 2.8e-6], [2, -1.5, 20, 3.5], [3, 4, 5, 6]])
+    assert np.isnan(grids[:, 1]).all()
+    assert np.array_equal(cards["CQUAD4"][0, :6], [10, 1, 1, 2, 3, 1])
+    assert cards["CBAR"].shape == (0, 8)
+
+
+def test_read_bulk_cards_missing_include(tmp_path):
+    (tmp_path / "main.dat").write_bytes(b"BEGIN BULK\r\nINCLUDE \"mesh.dat\"\r\nENDDATA\r\n")
+    with pytest.raises(FileNotFoundError):
+        rf.read_bulk_cards(str(tmp_path / "main.dat"))
+    with pytest.warns(UserWarning, match="mesh.dat"):
+        assert rf.read_bulk_cards(str(tmp_path / "main.dat"), missing_includes="warn")["GRID"].shape == (0, 8)
+
+
+def test_read_bulk_cards_gfem():
+    # The files of the INCLUDE 'SUBCASE_17500' and 'condensation' are not in the repository
+    deck = os.path.join(os.path.dirname(__file__), "..", "DEMO", "GFEM", "LAUNCHER_17500.dat")
+    with pytest.raises(FileNotFoundError):
+        rf.read_bulk_cards(deck)
+    with pytest.warns(UserWarning) as record:
+        cards = rf.read_bulk_cards(deck, ("GRID", "CQUAD4", "MAT1"), missing_includes="warn")
+    assert sorted(os.path.basename(str(w.message).split("'")[1]) for w in record) == ["SUBCASE_17500", "condensation"]
+    assert cards["GRID"].shape == (6441, 8)
+    assert cards["CQUAD4"].shape == (5715, 8)
+    assert np.allclose(cards["MAT1"][0, [0, 1, 3, 4]], [1, 70000., .3, 2.8e-6])
+
+
+class _Entity:
+    def __init__(self, **attributes):
+        self.__dict__.update(attributes)
+
+
+@pytest.fixture
+def mesh_model():
+    """Grid of 3x2 CQUAD4 with a CBUSH between the nodes 0 and 11 and a RBE2 from the node 5 to the nodes 6 and 9"""
+    nodes = [_Entity(ID=100 + i, PartID=0, InternalID=i, X=float(i % 4), Y=float(i // 4), Z=0.) for i in range(12)]
+    elements = [_Entity(ID=1 + i, PartID=0, InternalID=i, Nodes=[nodes[a], nodes[a + 1], nodes[a + 5], nodes[a + 4]])
+                for i, a in enumerate((0, 1, 2, 4, 5, 6))]
+    elements.append(_Entity(ID=50, PartID=0, InternalID=6, Nodes=[nodes[0], nodes[11]]))
+    # As N2PConnector, the nodes of the connector are given as (ID, PartID)
+    rbe2 = _Entity(ID=60, PartID="0", FreeNodes=[(105, 0)], SlaveNodes=[(106, 0), (109, 0)], GridIDs=[])
+    return _Entity(get_nodes=lambda: nodes, get_elements=lambda: elements, get_connectors=lambda: [[rbe2]])
+
+
+def test_mesh_graph(mesh_model):
+    pytest.importorskip("scipy")
+    graph = rf.mesh_graph(mesh_model)
+    assert graph["ElementID"].tolist() == [1, 2, 3, 4, 5, 6, 50, 60]
+    assert graph["IsConnector"].tolist() == [False] * 7 + [True]
+    assert np.allclose(graph["Centroids"][0], [.5, .5, 0.])
+    assert sorted(graph["Incidence"][7].indices) == [5, 6, 9]
+
+    # Edges of the shells, with the neighbors matrix saved in the graph
+    assert sorted(rf.element_neighbors(graph)[0].indices) == [1, 3]
+    assert rf.element_neighbors(graph) is graph["Neighbors"][2]
+    assert sorted(rf.elements_with_nodes(graph, [11])) == [5, 6]
+    assert sorted(rf.elements_with_nodes(graph, [5, 6], all_nodes=True)) == [1, 4, 7]
+
+    # The perimeter of the 3x2 grid has 10 edges. A list is also accepted
+    assert len(rf.free_edges(graph, [0, 1, 2, 3, 4, 5])) == 10
+    assert rf.free_edges(graph, np.array([0])).tolist() == [[0, 1], [0, 4], [1, 5], [4, 5]]
+
+    distance, nearest = graph["NodeTree"].query([0.1, 0.1, 0.], k=2)
+    assert nearest.tolist() == [0, 1]
+
+
+def test_mesh_graph_missing_connector_node(mesh_model):
+    pytest.importorskip("scipy")
+    mesh_model.get_connectors()[0][0].SlaveNodes.append((999, 0))
+    with pytest.raises(KeyError):
+        rf.mesh_graph(mesh_model)
+
+
+def test_free_edges_sorted_incidence():
+    pytest.importorskip("scipy")
+    graph = rf.mesh_graph(NumpyModel.grid(1, 1))
+
+    # scipy sorts the indices of the matrix in place, so the order of the nodes must not be taken from it
+    graph["Incidence"].sort_indices()
+    assert graph["Incidence"].indices.tolist() == [0, 1, 2, 3]
+    assert rf.free_edges(graph, [0]).tolist() == [[0, 1], [0, 2], [1, 3], [2, 3]]
+
+
+def test_numpy_model_from_deck():
+    deck = os.path.join(os.path.dirname(__file__), "..", "DEMO", "GFEM", "LAUNCHER_17500.dat")
+    with pytest.warns(UserWarning):
+        model = NumpyModel.from_deck(deck, copies=2, missing_includes="warn", n_loadcases=2)
+    elements = model.get_elements()
+    assert len(elements) == 2 * 5715
+    assert len(np.unique(rf.element_index(model)[0]["ID"])) == 2 * 5715
+
+    # The second copy is the first one moved 1000 in Z
+    first, second = elements[0], elements[5715]
+    assert [n.Z + 1000 for n in first.Nodes] == [n.Z for n in second.Nodes]
+    assert first.Prop == second.Prop
+
+
+@pytest.mark.filterwarnings("ignore:The file .* of an INCLUDE")
+def test_benchmark(tmp_path):
+    deck = os.path.join(os.path.dirname(__file__), "..", "DEMO", "GFEM", "LAUNCHER_17500.dat")
+    stats = benchmark.run(copies=1, loadcases=3, chunk=2, memory=True, deck=deck)
+    assert list(stats) == ["read_deck", "get_elements", "element_index", "to_internal_ids", "results_by_loadcases",
+                           "envelope_by_chunks", "combine_by_matrix", "derived_component_by_loadcases",
+                           "report_by_chunks_csv", "report_by_chunks_binary"]
+    assert all(s["seconds"] > 0 and s["peak_bytes"] > 0 for s in stats.values())
+
+    baseline = {step: {"seconds": s["seconds"] / 10} for step, s in stats.items()}
+    assert len(benchmark.compare(stats, baseline, 0.5)) == len(stats)
+    assert benchmark.compare(stats, stats, 0.5) == []
+
+    path = str(tmp_path / "baseline.json")
+    arguments = ["--loadcases", "3", "--chunk", "2", "--baseline", path]
+    assert benchmark.main(arguments + ["--save"]) == 0
+    assert benchmark.main(arguments + ["--tolerance", "100"]) == 0